@@ -2,40 +2,165 @@ import os
 import asyncio
 import websockets
 import requests
+from requests.adapters import HTTPAdapter
 import pyaudio
 import threading
+from collections import deque
 import json
-import base64
+import logging
 import wave
+import time
 from datetime import datetime
 from openai import OpenAI
 from dotenv import load_dotenv
 
+# orjson is an optional drop-in speedup for the per-frame JSON work.
+try:
+    import orjson
+
+    def json_loads(data):
+        return orjson.loads(data)
+
+    def json_dumps(obj):
+        # orjson returns UTF-8 bytes; decode so the server still gets text frames.
+        return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    def json_loads(data):
+        return json.loads(data)
+
+    def json_dumps(obj):
+        return json.dumps(obj, ensure_ascii=False)
+
+# pybase64 is a SIMD-accelerated, API-compatible replacement for the stdlib base64 module.
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
 # --- Configuration ---
 load_dotenv()
 API_BASE_URL = os.getenv("API_BASE_URL", "https://www.wavecraft.ai/api")
 AUTH_TOKEN = os.getenv("AUTH_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 IFLYTEK_APP_ID = os.getenv("IFLYTEK_APP_ID")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # Set to DEBUG to log every text chunk
 AUDIO_OUTPUT_DIR = "wavecraft/audio_logs"
+TEXT_BATCH_MAX_CHARS = 64     # Flush a text batch once it reaches this many characters...
+TEXT_BATCH_MAX_DELAY = 0.08   # ...or once it has been open this many seconds
+
+logger = logging.getLogger(__name__)
 
 if not all([AUTH_TOKEN, OPENAI_API_KEY, IFLYTEK_APP_ID]):
     print("Error: Please ensure AUTH_TOKEN, OPENAI_API_KEY, and IFLYTEK_APP_ID are set in your .env file")
     exit(1)
 
 # --- WebSocket and Audio Handling ---
+class AudioOut:
+    """
+    Owns PyAudio and a single callback-driven output stream for the whole game.
+    Each turn's TTS client feeds it PCM; the stream itself stays open between turns.
+    """
+    def __init__(self):
+        # Decoded PCM chunks waiting to be pulled by the PortAudio callback thread. Chunks are
+        # queued as received (no copy); _head_offset is how much of the first one has played.
+        self._ring = deque()
+        self._head_offset = 0
+        self._ring_lock = threading.Lock()
+        self._audio_finished = True  # Idle until the first turn starts
+        self.is_playing = False
+        self._playback_done = None
+        self._loop = None
+        self.p = pyaudio.PyAudio()
+        self.sample_width = self.p.get_sample_size(pyaudio.paInt16)  # Mono, so one sample per frame
+        self.stream = self.p.open(format=pyaudio.paInt16, channels=1, rate=16000, output=True,
+                                  frames_per_buffer=1024, stream_callback=self._pa_callback)
+
+    def start_turn(self):
+        """Prepares for a new turn's audio; must be called from the event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._playback_done = asyncio.Event()  # Set from the audio thread once playback drains
+        with self._ring_lock:
+            self._ring.clear()
+            self._head_offset = 0
+            self._audio_finished = False
+            self.is_playing = True
+
+    def write(self, raw_audio_bytes):
+        """Queues decoded PCM for the PortAudio callback."""
+        with self._ring_lock:
+            self._ring.append(raw_audio_bytes)
+
+    def end_turn(self):
+        """Marks the turn's audio as complete; playback ends once the ring drains."""
+        with self._ring_lock:
+            self._audio_finished = True
+
+    def _pa_callback(self, in_data, frame_count, time_info, status):
+        """PortAudio callback: hands the next block of PCM to the audio thread."""
+        needed = frame_count * self.sample_width
+        parts = []
+        remaining = needed
+        with self._ring_lock:
+            while remaining and self._ring:
+                chunk = self._ring[0]
+                end = self._head_offset + remaining
+                piece = chunk[self._head_offset:end]
+                parts.append(piece)
+                remaining -= len(piece)
+                if end >= len(chunk):
+                    self._ring.popleft()
+                    self._head_offset = 0
+                else:
+                    self._head_offset = end
+            drained = self.is_playing and self._audio_finished and not self._ring
+            if drained:
+                self.is_playing = False
+        if drained:
+            self._loop.call_soon_threadsafe(self._playback_done.set)
+        out = b''.join(parts)
+        if len(out) < needed:
+            # Underrun or idle between turns: pad with silence rather than stopping the stream
+            out += b'\x00' * (needed - len(out))
+        return (out, pyaudio.paContinue)
+
+    async def wait_until_drained(self):
+        """Waits until all of the current turn's audio has been handed to the sound card."""
+        if self._playback_done is not None:
+            await self._playback_done.wait()
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.p.terminate()
+        print("Audio resources released.")
+
+
 class TTSWebSocketClient:
-    def __init__(self, websocket_url, session_id, tts_params):
+    def __init__(self, websocket_url, session_id, tts_params, audio_out):
         self.websocket_url = websocket_url
         self.session_id = session_id
         self.tts_params = tts_params
+        self.audio_out = audio_out
         self.ws = None
-        self.p = pyaudio.PyAudio()
-        self.stream = self.p.open(format=pyaudio.paInt16, channels=1, rate=16000, output=True)
-        self.audio_queue = asyncio.Queue()
-        self.is_playing = False
-        self.play_thread = None
-        self.audio_frames = []
+        # This session's WAV file, written incrementally as audio arrives
+        self._wf = None
+        self._audio_filename = None
+        self._audio_bytes_written = 0
+        # The first frame's 'parameter' block is fixed per session, so serialize it once here
+        # and splice it into the first frame instead of encoding it on the send path
+        self._parameter_json = json_dumps({
+            "oral": {"oral_level": "mid"},
+            "tts": {
+                "vcn": tts_params['voice'],
+                "speed": tts_params['speed'],
+                "volume": tts_params['volume'],
+                "pitch": tts_params['pitch'],
+                "audio": {
+                    "encoding": "raw", "sample_rate": 16000,
+                    "channels": 1, "bit_depth": 16,
+                }
+            }
+        })
         self._setup_audio_directory()
 
     def _setup_audio_directory(self):
@@ -44,8 +169,13 @@ class TTSWebSocketClient:
 
 
     async def connect(self):
+        self.audio_out.start_turn()
+        self._open_audio_file()
         print(f"Connecting to WebSocket: {self.websocket_url}")
-        self.ws = await websockets.connect(self.websocket_url)
+        # Audio arrives as base64 text, so per-message deflate only costs CPU. Each turn uses a
+        # short-lived connection that the server closes itself, so keepalive pings are disabled.
+        self.ws = await websockets.connect(self.websocket_url, compression=None,
+                                           max_size=2**22, ping_interval=None)
         print("WebSocket connection successful!")
         asyncio.create_task(self.receive_audio())
 
@@ -53,15 +183,21 @@ class TTSWebSocketClient:
         try:
             while True:
                 message = await self.ws.recv()
-                # iFlytek always sends JSON strings, not raw bytes.
-                data = json.loads(message)
+                # websockets returns bytes for binary frames and str for text frames
+                if not isinstance(message, str):
+                    self._handle_binary(message)
+                    continue
+
+                # iFlytek currently sends JSON strings with base64 audio.
+                data = json_loads(message)
+                header = data.get('header', {})
 
                 # Log the server message for debugging if needed
                 # print(f"[WebSocket Server]: {json.dumps(data, indent=2)}")
 
                 # Check for errors from the server
-                if data.get('header', {}).get('code') != 0:
-                    print(f"Server Error: {data.get('header', {}).get('message')}")
+                if header.get('code') != 0:
+                    print(f"Server Error: {header.get('message')}")
                     continue
 
                 # Extract audio data
@@ -70,52 +206,72 @@ class TTSWebSocketClient:
                     audio_data_b64 = payload.get('audio', {}).get('audio')
                     if audio_data_b64:
                         # Decode the base64 audio data
-                        raw_audio_bytes = base64.b64decode(audio_data_b64)
-                        self.audio_frames.append(raw_audio_bytes)
-                        await self.audio_queue.put(raw_audio_bytes)
+                        raw_audio_bytes = base64.b64decode(audio_data_b64, validate=False)
+                        self._feed_audio(raw_audio_bytes)
 
                 # Check for the end of the stream
-                if data.get('header', {}).get('status') == 2:
+                if header.get('status') == 2:
                     print("Audio stream finished.")
-                    await self.audio_queue.put(None)  # Signal end of audio playback
+                    self._end_audio()  # Signal end of audio playback
                     break
 
         except websockets.exceptions.ConnectionClosed as e:
             print(f"WebSocket connection closed. Details:")
             print(f"  - Code: {e.code}")
             print(f"  - Reason: {e.reason}")
-            await self.audio_queue.put(None)  # Ensure player stops
+            self._end_audio()  # Ensure player stops
         except json.JSONDecodeError:
             print(f"[WebSocket Server Raw Non-JSON]: {message}")
+            self._end_audio()
         except Exception as e:
             print(f"Error receiving audio: {e}")
-            await self.audio_queue.put(None)
+            self._end_audio()
 
 
-    async def send_text_stream(self, text_generator):
+    def _handle_binary(self, message):
+        """Binary frames carry raw PCM, so they skip the JSON parse and base64 decode."""
+        self._feed_audio(message)
+
+    async def send_text_stream(self, text_queue):
+        """Streams text from text_queue (terminated by None) to the TTS server."""
         print("\n--- Starting to send text stream to TTS ---")
         full_text = ""
         seq = 0
         is_first = True
 
+        # Reuse one frame dict for the whole stream; only status, seq and text change per chunk
+        frame = {
+            "header": {"app_id": IFLYTEK_APP_ID, "status": 0},
+            "payload": {
+                "text": {
+                    "encoding": "utf8",
+                    "compress": "raw",
+                    "format": "plain",
+                    "status": 0,
+                    "seq": 0,
+                    "text": ""
+                }
+            }
+        }
+        text_payload = frame["payload"]["text"]
+
         try:
-            # Create an iterator from the generator to allow lookahead
-            iterator = iter(text_generator)
-            current_chunk = next(iterator, None)  # Get the first chunk
+            # Coalesce the LLM's tiny chunks into batches, then iterate with lookahead
+            iterator = self._batch_text_chunks(text_queue)
+            current_chunk = await anext(iterator, None)  # Get the first batch
 
             if current_chunk is None:
                 print("Text generator is empty, sending nothing.")
+                # The server will never send a final frame, so end playback here
+                self._end_audio()
                 return ""
 
             while current_chunk is not None:
                 # Clean up the chunk
                 chunk_to_send = current_chunk.strip()
-                if not chunk_to_send:
-                    current_chunk = next(iterator, None)
-                    continue
 
-                # Look ahead to the next chunk to determine if this one is the last
-                next_chunk = next(iterator, None)
+                # Look ahead to the next batch to determine if this one is the last
+                next_chunk = await anext(iterator, None)
 
                 # Determine the status for the iFlytek protocol
                 if is_first and next_chunk is None:
@@ -127,139 +283,147 @@ class TTSWebSocketClient:
                 else:
                     status = 1  # This is an intermediate chunk
 
-                # Build the frame payload
-                frame = {
-                    "header": {"app_id": IFLYTEK_APP_ID, "status": status},
-                    "payload": {
-                        "text": {
-                            "encoding": "utf8",
-                            "compress": "raw",
-                            "format": "plain",
-                            "status": status,
-                            "seq": seq,
-                            "text": base64.b64encode(chunk_to_send.encode('utf-8')).decode('utf-8')
-                        }
-                    }
-                }
+                # Fill in the per-chunk fields of the frame.
+                # The iFlytek protocol requires the text to be base64, even with compress=raw.
+                frame["header"]["status"] = status
+                text_payload["status"] = status
+                text_payload["seq"] = seq
+                text_payload["text"] = base64.b64encode(chunk_to_send.encode('utf-8')).decode('ascii')
 
+                message = json_dumps(frame)
                 # The 'parameter' block is only sent with the very first frame
                 if is_first:
-                    frame["parameter"] = {
-                        "oral": {"oral_level": "mid"},
-                        "tts": {
-                            "vcn": self.tts_params['voice'],
-                            "speed": self.tts_params['speed'],
-                            "volume": self.tts_params['volume'],
-                            "pitch": self.tts_params['pitch'],
-                            "audio": {
-                                "encoding": "raw", "sample_rate": 16000,
-                                "channels": 1, "bit_depth": 16,
-                            }
-                        }
-                    }
-                    is_first = False
-
-                print(f"  [Sending chunk {seq}]: {chunk_to_send}")
-                await self.ws.send(json.dumps(frame, ensure_ascii=False))
-
-                full_text += chunk_to_send
+                    message = '{"parameter":' + self._parameter_json + ',' + message[1:]
+
+                logger.debug("  [Sending chunk %d]: %s", seq, chunk_to_send)
+                await self.ws.send(message)
+                is_first = False
+
+                full_text += current_chunk
                 seq += 1
-                current_chunk = next_chunk  # Move to the next chunk
-                await asyncio.sleep(0.05)  # Small delay to prevent flooding
+                current_chunk = next_chunk  # Move to the next batch
 
             print("--- Text stream sent ---\n")
             return full_text
-        except StopIteration:
-            # This handles the case of an empty generator gracefully
-            print("Text stream ended normally.")
-            return ""
         except websockets.exceptions.ConnectionClosed as e:
             print(f"Connection closed while sending text: {e}")
             return full_text
         except Exception as e:
             print(f"Error sending text: {e}")
+            if seq == 0:
+                self._end_audio()  # Nothing reached the server, so no audio will follow
             return full_text
 
 
-    def _play_audio_sync(self):
-        """Synchronous function to play audio from the queue."""
-        self.is_playing = True
-        print("\n--- Starting audio playback ---")
+    async def _batch_text_chunks(self, text_queue):
+        """
+        Groups consecutive text chunks so each WebSocket frame carries several tokens.
+        A batch is flushed once it holds TEXT_BATCH_MAX_CHARS characters or has been
+        open for TEXT_BATCH_MAX_DELAY seconds. Whitespace-only batches are never yielded.
+        """
+        buffer = []
+        buffered_chars = 0
+        has_text = False
+        deadline = 0.0
+
         while True:
-            try:
-                # Use a timeout to prevent blocking indefinitely
-                chunk = self.audio_queue.get_nowait()
-                if chunk is None: # End of stream signal
-                    self.audio_queue.task_done()
-                    break
-                self.stream.write(chunk)
-                self.audio_queue.task_done()
-            except asyncio.QueueEmpty:
-                # Wait a bit before trying again if the queue is empty
-                asyncio.run(asyncio.sleep(0.01))
-            except Exception as e:
-                print(f"Error playing audio: {e}")
+            if not text_queue.empty():
+                # Text the LLM thread has already queued is taken without another await
+                # (and without wait_for's per-call timer), so bursts merge into one frame
+                chunk = text_queue.get_nowait()
+            elif has_text:
+                # Wait for more text only until the batch's time window closes
+                try:
+                    chunk = await asyncio.wait_for(text_queue.get(),
+                                                   timeout=max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    yield "".join(buffer)
+                    buffer.clear()
+                    buffered_chars = 0
+                    has_text = False
+                    continue
+            else:
+                chunk = await text_queue.get()
+
+            if chunk is None:  # End of the LLM stream
                 break
-        print("--- Audio playback finished ---\n")
-        self.is_playing = False
 
-    async def play_audio_async(self):
-        """Asynchronous wrapper to run the synchronous play function in a thread."""
-        if not self.is_playing:
-            loop = asyncio.get_event_loop()
-            # The play_thread runs the synchronous _play_audio_sync
-            self.play_thread = threading.Thread(target=self._play_audio_sync, daemon=True)
-            self.play_thread.start()
+            if not buffer:
+                deadline = time.monotonic() + TEXT_BATCH_MAX_DELAY
+            buffer.append(chunk)
+            buffered_chars += len(chunk)
+            has_text = has_text or bool(chunk.strip())
+
+            if has_text and (buffered_chars >= TEXT_BATCH_MAX_CHARS
+                             or time.monotonic() >= deadline):
+                yield "".join(buffer)
+                buffer.clear()
+                buffered_chars = 0
+                has_text = False
+
+        if has_text:
+            yield "".join(buffer)
+
+    def _feed_audio(self, raw_audio_bytes):
+        """Appends decoded PCM to the WAV file and hands it to the audio output."""
+        if self._wf is not None:  # Late frames can still arrive while close() runs
+            self._wf.writeframesraw(raw_audio_bytes)
+            self._audio_bytes_written += len(raw_audio_bytes)
+        self.audio_out.write(raw_audio_bytes)
+
+    def _end_audio(self):
+        """Marks this session's audio as complete."""
+        self.audio_out.end_turn()
 
     async def wait_for_playback_to_finish(self):
-        """Waits for the playback thread to complete."""
-        if self.play_thread and self.play_thread.is_alive():
-           # This is tricky because we are mixing async and threads.
-           # A better approach for production would be a fully async audio library.
-           while self.is_playing:
-               await asyncio.sleep(0.1)
+        """Waits until all received audio has been handed to the sound card."""
+        await self.audio_out.wait_until_drained()
+        print("--- Audio playback finished ---\n")
 
 
-    def _save_audio_to_file(self):
-        """Saves the collected audio frames to a WAV file."""
-        if not self.audio_frames:
-            print("No audio to save.")
+    def _open_audio_file(self):
+        """Opens this session's WAV file so audio can be streamed to disk as it arrives."""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._audio_filename = os.path.join(AUDIO_OUTPUT_DIR, f"session_{self.session_id}_{timestamp}.wav")
+        self._wf = wave.open(self._audio_filename, 'wb')
+        self._wf.setnchannels(1)
+        self._wf.setsampwidth(self.audio_out.sample_width)
+        self._wf.setframerate(16000)
+
+    def _close_audio_file(self):
+        """Finalizes the WAV header, or removes the file if no audio was received."""
+        if self._wf is None:
             return
+        self._wf.close()  # wave patches the RIFF header with the final length on close
+        self._wf = None
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = os.path.join(AUDIO_OUTPUT_DIR, f"session_{self.session_id}_{timestamp}.wav")
-        
-        print(f"\nSaving audio to: {filename}")
-        
-        with wave.open(filename, 'wb') as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(self.p.get_sample_size(pyaudio.paInt16))
-            wf.setframerate(16000)
-            wf.writeframes(b''.join(self.audio_frames))
-        
-        print("Audio saved successfully.")
+        if not self._audio_bytes_written:
+            os.remove(self._audio_filename)
+            print("No audio to save.")
+            return
+        print(f"\nAudio saved to: {self._audio_filename}")
 
     async def close(self):
         if self.ws:
             await self.ws.close()
             print("WebSocket connection closed.")
 
-        # Save audio before terminating PyAudio
-        self._save_audio_to_file()
-
-        self.stream.stop_stream()
-        self.stream.close()
-        self.p.terminate()
-        print("Audio resources released.")
+        # The audio output stream is shared across turns and closed by the game loop
+        self._close_audio_file()
 
 
 # --- API Interaction ---
+# One pooled, keep-alive session for all API calls so each turn reuses the open TLS connection.
+SESSION = requests.Session()
+SESSION.headers.update({"Authorization": f"Bearer {AUTH_TOKEN}"})
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+SESSION.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
 def get_tts_websocket_url(text_to_initiate, voice="x5_lingfeiyi_flow"):
     """
     获取 TTS WebSocket URL。
     """
     url = f"{API_BASE_URL}/tts-stream"
-    headers = {"Authorization": f"Bearer {AUTH_TOKEN}"}
     params = {
         "text": text_to_initiate,
         "voice": voice,
@@ -269,7 +433,7 @@ def get_tts_websocket_url(text_to_initiate, voice="x5_lingfeiyi_flow"):
     }
     print(f"Getting WebSocket URL from {url}...")
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = SESSION.get(url, params=params)
         response.raise_for_status()
         data = response.json()
         print("Successfully retrieved WebSocket URL and Session ID.")
@@ -287,7 +451,6 @@ def confirm_session(session_id, success=True):
     确认或取消会话（用于计费）。
     """
     url = f"{API_BASE_URL}/tts-stream"
-    headers = {"Authorization": f"Bearer {AUTH_TOKEN}"}
     payload = {
         "sessionId": session_id,
         "success": success,
@@ -295,7 +458,7 @@ def confirm_session(session_id, success=True):
     }
     print(f"\nConfirming session {session_id}...")
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        response = SESSION.post(url, json=payload)
         response.raise_for_status()
         print(f"Session confirmed successfully: {response.json()}")
     except requests.exceptions.RequestException as e:
@@ -308,10 +471,9 @@ def cancel_session(session_id):
     取消会话。
     """
     url = f"{API_BASE_URL}/tts-stream?sessionId={session_id}"
-    headers = {"Authorization": f"Bearer {AUTH_TOKEN}"}
     print(f"\nCancelling session {session_id}...")
     try:
-        response = requests.delete(url, headers=headers)
+        response = SESSION.delete(url)
         response.raise_for_status()
         print(f"Session cancelled successfully: {response.json()}")
     except requests.exceptions.RequestException as e:
@@ -320,13 +482,16 @@ def cancel_session(session_id):
             print(f"Response content: {e.response.text}")
 
 # --- OpenAI Integration ---
-def get_openai_stream(messages):
+def get_openai_stream(messages, loop, text_queue):
     """
     从 OpenAI 获取流式响应。
+    Runs in a worker thread: each chunk is handed to text_queue on the event loop,
+    followed by None once the stream ends.
     """
-    client = OpenAI(api_key=OPENAI_API_KEY,base_url="https://kjp.bt6.top/v1/")
     print("\n--- Getting response stream from OpenAI ---")
     try:
+        # Built inside the try so a constructor failure still queues the fallback and sentinel
+        client = OpenAI(api_key=OPENAI_API_KEY,base_url="https://kjp.bt6.top/v1/")
         stream = client.chat.completions.create(
             model="gemini-2.5-flash-lite-preview-06-17",
             messages=messages,
@@ -335,14 +500,43 @@ def get_openai_stream(messages):
         for chunk in stream:
             content = chunk.choices[0].delta.content or ""
             if content:
-                print(f"  [OpenAI chunk]: {content.strip()}")
-                yield content
+                logger.debug("  [OpenAI chunk]: %s", content)
+                loop.call_soon_threadsafe(text_queue.put_nowait, content)
     except Exception as e:
         print(f"Error getting stream from OpenAI: {e}")
-        yield "Sorry, I ran into a problem."
+        loop.call_soon_threadsafe(text_queue.put_nowait, "Sorry, I ran into a problem.")
+    finally:
+        loop.call_soon_threadsafe(text_queue.put_nowait, None)
 
 
 # --- Game Logic ---
+async def async_input(prompt):
+    """
+    Reads a line from stdin in a daemon thread so the event loop keeps running while the
+    user types. Unlike asyncio.to_thread, a pending read never blocks interpreter shutdown.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result, error):
+        if future.done():  # The awaiting task was cancelled, e.g. by Ctrl+C
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def read_line():
+        try:
+            line = input(prompt)
+        except BaseException as e:  # Hand every failure back, like asyncio.to_thread would
+            loop.call_soon_threadsafe(resolve, None, e)
+        else:
+            loop.call_soon_threadsafe(resolve, line, None)
+
+    threading.Thread(target=read_line, daemon=True).start()
+    return await future
+
 async def emotional_dialogue_game():
     """
     情感对话游戏主逻辑。
@@ -351,7 +545,7 @@ async def emotional_dialogue_game():
     print("Welcome to the Emotional Dialogue Game")
     print("="*50)
     
-    character_setting = input("Please enter the character setting you want to talk to (e.g., 'A wise but slightly sad ancient robot'):\n> ")
+    character_setting = await async_input("Please enter the character setting you want to talk to (e.g., 'A wise but slightly sad ancient robot'):\n> ")
     
     messages = [
         {"role": "system", "content": f"You are now playing the following character. Engage in a short, emotional conversation with the user. Fully immerse yourself in the character. Your character setting is: '{character_setting}'"},
@@ -359,14 +553,18 @@ async def emotional_dialogue_game():
     ]
 
     current_turn_session_id = None
+    audio_out = None
 
     try:
+        # Open the audio device once and reuse it for every turn
+        audio_out = AudioOut()
+
         # Initial greeting from the AI
-        await handle_ai_turn(messages, character_setting)
+        await handle_ai_turn(messages, character_setting, audio_out)
 
         # Main conversation loop
         while True:
-            user_input = input("You: ")
+            user_input = await async_input("You: ")
             if user_input.lower() in ['退出', 'exit', 'quit']:
                 print("Thank you for playing. Game over.")
                 # The last session is confirmed inside handle_ai_turn
@@ -374,7 +572,7 @@ async def emotional_dialogue_game():
             
             messages.append({"role": "user", "content": user_input})
             
-            await handle_ai_turn(messages, character_setting)
+            await handle_ai_turn(messages, character_setting, audio_out)
 
     except (KeyboardInterrupt, EOFError):
         print("\nInterrupt detected. Game over.")
@@ -383,15 +581,18 @@ async def emotional_dialogue_game():
     except Exception as e:
         print(f"An unexpected error occurred in the game loop: {e}")
     finally:
+        if audio_out:
+            audio_out.close()
         print("Game client closed.")
 
-async def handle_ai_turn(messages, character_setting):
+async def handle_ai_turn(messages, character_setting, audio_out):
     """
     Handles a single turn of the AI speaking, including getting a new TTS session.
     """
     # 1. Get a new WebSocket URL for this specific turn.
     # The initial text is just for API validation; it won't be spoken.
-    response_data = get_tts_websocket_url("start turn")
+    # The blocking HTTP calls run in a worker thread so the event loop keeps servicing the WebSocket.
+    response_data = await asyncio.to_thread(get_tts_websocket_url, "start turn")
     if not response_data:
         print("Could not get TTS session for this turn, please try again.")
         return
@@ -400,18 +601,19 @@ async def handle_ai_turn(messages, character_setting):
     tts_client = TTSWebSocketClient(
         websocket_url=response_data['websocketUrl'],
         session_id=session_id,
-        tts_params=response_data['parameters']
+        tts_params=response_data['parameters'],
+        audio_out=audio_out
     )
 
     try:
         await tts_client.connect()
-        
-        # Start the audio player task
-        asyncio.create_task(tts_client.play_audio_async())
 
-        # Get OpenAI stream and send it to the new TTS connection
-        response_stream = get_openai_stream(messages)
-        full_response = await tts_client.send_text_stream(response_stream)
+        # Read the OpenAI stream in a worker thread and send it to the new TTS connection
+        text_queue = asyncio.Queue()
+        threading.Thread(target=get_openai_stream,
+                         args=(messages, asyncio.get_running_loop(), text_queue),
+                         daemon=True).start()
+        full_response = await tts_client.send_text_stream(text_queue)
         
         # Update conversation history
         if full_response:
@@ -424,12 +626,12 @@ async def handle_ai_turn(messages, character_setting):
             print(f"\nAI ({character_setting[:10]}...): {full_response}\n")
 
         # This turn was successful
-        confirm_session(session_id, success=True)
+        await asyncio.to_thread(confirm_session, session_id, success=True)
 
     except Exception as e:
         print(f"Error handling AI turn: {e}")
         # Mark this session as failed for billing purposes
-        confirm_session(session_id, success=False)
+        await asyncio.to_thread(confirm_session, session_id, success=False)
     finally:
         # Crucially, close the connection and save the audio for THIS turn.
         await tts_client.close()
@@ -445,6 +647,21 @@ if __name__ == "__main__":
         print("Created .env file. Please fill in your API_BASE_URL, AUTH_TOKEN, OPENAI_API_KEY, and IFLYTEK_APP_ID.")
         exit(0)
 
+    # Keep third-party libraries at WARNING; LOG_LEVEL only applies to this script's logger
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    log_level = logging.getLevelName(LOG_LEVEL)  # An int for known level names, a str otherwise
+    if not isinstance(log_level, int):
+        print(f"Warning: unknown LOG_LEVEL '{LOG_LEVEL}', falling back to INFO.")
+        log_level = logging.INFO
+    logger.setLevel(log_level)
+
+    # uvloop is an optional, faster event loop; it is POSIX-only, so skip it where unavailable
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
     try:
         asyncio.run(emotional_dialogue_game())
     except KeyboardInterrupt: